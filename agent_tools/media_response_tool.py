@@ -4,43 +4,90 @@ from config import logger
 from db import engine, conversation, message, media_files, categories
 from sqlalchemy import select, or_
 import json
-from datetime import datetime
+from datetime import datetime, timezone
 
 _logger = logger(__name__)
 
-def send_media_tool(category: str, subcategory: str, user_ph: str, caption="") -> dict:
-    _logger.info(f"[MEDIA TOOL] Called with category='{category}', subcategory='{subcategory}', user_ph={user_ph}")
-    responses = []
+# The library is small and read-mostly: keep a snapshot in memory and refresh it
+# periodically so new uploads still appear
+MEDIA_LIBRARY_TTL = 300
+MEDIA_MATCH_CACHE_MAX = 256
+# "matches" memoizes search results per (category, subcategory) for the current snapshot
+_media_library = {"expires_at": 0.0, "entries": [], "matches": {}}
+
+
+def _load_media_library() -> list:
+    """(category, subcategory, media row) for every library file, lowercased for matching"""
+    now = time.monotonic()
+    if _media_library["expires_at"] > now:
+        return _media_library["entries"]
+
+    query = (
+        select(
+            media_files.c.id.label("media_id"),
+            media_files.c.wa_media_id,
+            media_files.c.file_type,
+            media_files.c.file_extension,
+            media_files.c.subcategory,
+            categories.c.name.label("category"),
+        )
+        .select_from(media_files.join(categories, media_files.c.category_id == categories.c.id))
+    )
 
+    # Read-only: nothing to commit, so connect() rather than begin()
+    with engine.connect() as conn:
+        entries = [
+            ((row["category"] or "").lower(), (row["subcategory"] or "").lower(), row)
+            for row in conn.execute(query).mappings()
+        ]
+
+    _media_library["entries"] = entries
+    _media_library["matches"] = {}
+    _media_library["expires_at"] = now + MEDIA_LIBRARY_TTL
+    _logger.info(f"Loaded {len(entries)} media library entries")
+
+    return entries
+
+
+def _find_media(category: str, subcategory: str) -> list:
+    """Library media whose category (and subcategory, if given) contains the search terms"""
+    category = category.lower()
+    subcategory = subcategory.lower() if subcategory else ""
+
+    entries = _load_media_library()
+    matches = _media_library["matches"]
+    cache_key = (category, subcategory)
+
+    rows = matches.get(cache_key)
+    if rows is None:
+        # Same matching as the previous ILIKE '%term%' filters, served from memory
+        rows = [
+            row for row_category, row_subcategory, row in entries
+            if category in row_category and (not subcategory or subcategory in row_subcategory)
+        ]
+
+        # Arguments come from the LLM, so bound the number of distinct keys kept
+        if len(matches) >= MEDIA_MATCH_CACHE_MAX:
+            matches.clear()
+        matches[cache_key] = rows
+
+    return rows
 
-    category_like = f"%{category.lower()}%"
-    sub_cat_like = f"%{subcategory.lower()}%" if subcategory else None
-
-    with engine.begin() as conn:
-        base_query = (
-            select(
-                media_files.c.id.label("media_id"),
-                media_files.c.wa_media_id,
-                media_files.c.file_type,
-                media_files.c.file_extension,
-            )
-            .select_from(media_files.join(categories, media_files.c.category_id == categories.c.id))
-            .where(
-                categories.c.name.ilike(category_like)
-            )
-        )
 
-        # If subcategory provided → filter
-        if sub_cat_like:
-            base_query = base_query.where(media_files.c.subcategory.ilike(sub_cat_like))
+def send_media_tool(category: str, subcategory: str, user_ph: str, caption="") -> dict:
+    _logger.info(f"[MEDIA TOOL] Called with category='{category}', subcategory='{subcategory}', user_ph={user_ph}")
+    responses = []
 
-        result = conn.execute(base_query)
-        rows = result.mappings().all()
+    rows = _find_media(category, subcategory)
 
     if not rows:
         _logger.warning(f"No media for category '{category}' subcategory '{subcategory}'")
         return {"results": [], "message": "No media found"}
 
+    # Send in order, then log every sent media in one executemany insert
+    log_rows = []
+    send_error = None
+
     for row in rows:
         wa_id = row["wa_media_id"]
 
@@ -51,43 +98,48 @@ def send_media_tool(category: str, subcategory: str, user_ph: str, caption="") -
 
         except Exception as e:
             _logger.error(f"Failed to send WA media ID {wa_id}: {str(e)}")
-            return {"response": str(e)}
+            send_error = str(e)
+            break
 
-        # Insert into DB
+        responses.append(response)
+
+        try:
+            log_rows.append({
+                "direction": "outbound",
+                "sender_type": "ai",
+                "external_id": response['messages'][0]['id'],
+                "has_text": True if caption else False,
+                "message_text": caption if caption else None,
+                "media_info": json.dumps({
+                    "id": wa_id,
+                    "mime_type": resolve_mime(row["file_type"], row["file_extension"]),
+                    "description": "NO DESCRIPTION"
+                }),
+                "status": "pending",
+                "provider_ts": datetime.now(timezone.utc),
+            })
+        except Exception as e:
+            _logger.error(f"DB log failed for WA ID {wa_id}: {e}")
+
+    # Insert into DB
+    if log_rows:
         with engine.begin() as conn:
             try:
-                conv_row = conn.execute(
+                # Single column, single row: scalar() skips building a Row mapping
+                conversation_id = conn.scalar(
                     select(conversation.c.id).where(conversation.c.phone == str(user_ph))
-                ).mappings().first()
-
-                conversation_id = conv_row["id"] if conv_row else None
-
-                mime = resolve_mime(row["file_type"], row["file_extension"])
+                )
+                for log_row in log_rows:
+                    log_row["conversation_id"] = conversation_id
 
-                payload = {
-                    "conversation_id": conversation_id, 
-                    "direction": "outbound",
-                    "sender_type": "ai",
-                    "external_id": response['messages'][0]['id'],
-                    "has_text": True if caption else False,
-                    "message_text": caption if caption else None,
-                    "media_info": json.dumps({
-                        "id": wa_id,
-                        "mime_type": mime,
-                        "description": "NO DESCRIPTION"
-                    }),
-                    "status": "pending",
-                    "provider_ts": datetime.utcnow().isoformat(),
-                }
-
-                conn.execute(message.insert().values(payload))
-                _logger.info(f"DB logged for WA ID: {wa_id}")
-
-                responses.append(response)
+                conn.execute(message.insert(), log_rows)
+                _logger.info(f"DB logged {len(log_rows)} media messages for {user_ph}")
 
             except Exception as e:
-                _logger.error(f"DB log failed for WA ID {wa_id}: {e}")
-                responses.append(response)
+                _logger.error(f"DB log failed for {user_ph}: {e}")
+
+    if send_error is not None:
+        return {"response": send_error}
 
     return {"results": responses}
 
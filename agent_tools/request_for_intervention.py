@@ -12,29 +12,28 @@ def callIntervention(state, user_ph: str):
         return
 
     try:
-        with engine.begin() as conn:
-            row = conn.execute(
+        # Read-only lookup; release the connection before calling the takeover service
+        with engine.connect() as conn:
+            already_required = conn.scalar(
                 select(conversation.c.human_intervention_required).where(
                     conversation.c.phone == str(user_ph)
                 )
-            ).mappings().first()
-
-            already_required = row and row["human_intervention_required"]
-
-            if not already_required:
-                # Call operator notification service
-                response = requests.post(
-                    f"{AI_BACKEND_URL}/takeover", json={"phone": user_ph}
+            )
+
+        if not already_required:
+            # Call operator notification service
+            response = requests.post(
+                f"{AI_BACKEND_URL}/takeover", json={"phone": user_ph}
+            )
+            response = response.json()
+            
+            if response["status"] == "takeover_complete":
+                _logger.info(f"Intervention requested for {user_ph}")
+                return response
+            else:
+                _logger.warning(
+                    f"Intervention request failed for {user_ph}, status={response.status_code}"
                 )
-                response = response.json()
-                
-                if response["status"] == "takeover_complete":
-                    _logger.info(f"Intervention requested for {user_ph}")
-                    return response
-                else:
-                    _logger.warning(
-                        f"Intervention request failed for {user_ph}, status={response.status_code}"
-                    )
 
     except Exception as e:
         _logger.error(f"RequestIntervention failed for {user_ph}: {e}")
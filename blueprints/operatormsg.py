@@ -8,6 +8,7 @@ from sqlalchemy import select
 from sqlalchemy.exc import OperationalError, DBAPIError
 import json
 import time
+import os
 
 operator_bp = Blueprint('operatormsg', __name__)
 _logger = logger(__name__)
@@ -45,7 +46,6 @@ def download_operator_media(file_id: str, mime_type: str):
     """
     import requests
     import tempfile
-    import os
     
     download_url = f"{BACKEND_BASE_URL}api/v1/get-sent-media"
     
@@ -109,6 +109,54 @@ def download_operator_media(file_id: str, mime_type: str):
         return {"success": False, "error": str(e)}
 
 
+def open_operator_media_stream(file_id: str, mime_type: str):
+    """
+    Open a streaming download of media from interface backend
+    
+    Lets the caller pipe the body straight into the WhatsApp upload. Only
+    succeeds when the backend reports a plain Content-Length, since the
+    Graph API upload needs the size up front; otherwise callers should
+    fall back to download_operator_media.
+    """
+    import requests
+    
+    download_url = f"{BACKEND_BASE_URL}api/v1/get-sent-media"
+    
+    try:
+        _logger.info(f"Opening media stream: fileId={file_id}, mimeType={mime_type}")
+        
+        response = requests.get(
+            download_url,
+            params={"fileId": file_id, "type": mime_type},
+            stream=True,
+            timeout=(10, 120)
+        )
+        
+        if not response.ok:
+            _logger.error(f"Failed to open media stream. Status: {response.status_code}")
+            response.close()
+            return {"success": False, "error": f"Download failed with status {response.status_code}"}
+        
+        content_length = response.headers.get("Content-Length")
+        if not content_length or response.headers.get("Content-Encoding"):
+            response.close()
+            return {"success": False, "error": "Stream size unknown"}
+        
+        media_type, file_ext = get_media_type_and_extension(mime_type)
+        
+        return {
+            "success": True,
+            "response": response,
+            "media_type": media_type,
+            "file_name": f"operator_media_{file_id}{file_ext}",
+            "file_size": int(content_length)
+        }
+        
+    except requests.RequestException as e:
+        _logger.exception(f"Failed to open media stream {file_id}: {str(e)}")
+        return {"success": False, "error": str(e)}
+
+
 def store_operator_message_with_retry(message_text: str, phone: str, message_id: str = None, **kwargs):
     """Store operator message with automatic retry on connection errors"""
     max_retries = 3
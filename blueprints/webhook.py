@@ -2,6 +2,7 @@ from flask import Blueprint, request
 from config import logger, VERIFY_TOKEN
 from utility import normalize_webhook_payload, is_duplicate, get_message_buffer
 from tasks import update_message_status_task, check_buffer_task
+import logging
 import time
 import json
 
@@ -14,7 +15,9 @@ message_buffer = get_message_buffer()
 def webhook():
     if request.method == 'POST':
         data = request.get_json()
-        _logger.info(f"RECEIVED WHATSAPP WEBHOOK DATA: {json.dumps(data, indent = 2)}")
+        # Pretty-printing every payload is costly; only do it when debug output is on
+        if _logger.isEnabledFor(logging.DEBUG):
+            _logger.debug("RECEIVED WHATSAPP WEBHOOK DATA: %s", json.dumps(data, indent=2))
 
         normalized_data = normalize_webhook_payload(data)
 
@@ -39,7 +42,8 @@ def webhook():
             return "OK", 200
 
         elif normalized_data["type"] == "status":
-            _logger.info(f"Message status update received: {json.dumps(normalized_data, indent=2)}")
+            if _logger.isEnabledFor(logging.DEBUG):
+                _logger.debug("Message status update received: %s", json.dumps(normalized_data, indent=2))
             status_msg_id = normalized_data.get('id', 'unknown')
             status = normalized_data.get('status', 'unknown')
                            
@@ -2,7 +2,7 @@ from typing import Annotated, List
 from typing_extensions import TypedDict
 from langgraph.graph import StateGraph, START, END 
 from langgraph.graph.message import AnyMessage, add_messages
-from langchain_core.messages import ToolMessage
+from langchain_core.messages import ToolMessage, SystemMessage
 from langchain.chat_models import init_chat_model
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables import RunnableConfig
@@ -187,8 +187,13 @@ def RequestIntervention(
     return Command(update={"operator_active": True, "messages": [ToolMessage("Success", tool_call_id=tool_call_id)]})
 
 
+with open("gemini_system_prompt.txt", "r") as f1:
+    GEMINI_SYSTEM_PROMPT = f1.read()
+
+# System prompt is bound once as a literal message, so only the
+# conversation flows through the template per call
 prompt_template = ChatPromptTemplate.from_messages([
-    ("system", "{system_message}"),
+    SystemMessage(content=GEMINI_SYSTEM_PROMPT),
     MessagesPlaceholder("messages")
 ])
 
@@ -197,15 +202,10 @@ gemini =  init_chat_model("google_genai:gemini-2.5-flash")
 
 gemini_with_tools = gemini.bind_tools([RespondWithMedia, RequestIntervention])
 gemini_agent = prompt_template | gemini_with_tools
-with open("gemini_system_prompt.txt", "r") as f1:
-    GEMINI_SYSTEM_PROMPT = f1.read()
 
 
 def gemini_node(state: State):
-    ai_resp = gemini_agent.invoke({
-        "system_message": GEMINI_SYSTEM_PROMPT,
-        "messages": state['messages']
-    })
+    ai_resp = gemini_agent.invoke({"messages": state['messages']})
 
     return {
         "messages": [ai_resp],
@@ -213,11 +213,9 @@ def gemini_node(state: State):
 
 def isToolCall(state: State):
     """Check if Gemini called any tools"""
-    last_message = state['messages'][-1]
-    if hasattr(last_message, "tool_calls") and last_message.tool_calls:
+    if getattr(state['messages'][-1], "tool_calls", None):
         return "tool_call"
-    else:
-        return "no_tool_call"
+    return "no_tool_call"
 
 graph_builder = StateGraph(State)
 graph_builder.add_node("gemini", gemini_node)
@@ -266,7 +264,7 @@ def stream_graph_updates(user_ph: str, user_input: dict) -> dict:
             turn_count += 1
             
             for node_name, value in events.items():
-                _logger.info(f"Processing node: {node_name}")
+                _logger.debug("Processing node: %s", node_name)
                 
                 if node_name == "gemini" and "messages" in value and value["messages"]:
                     last_message = value["messages"][-1]
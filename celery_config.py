@@ -1,49 +1,78 @@
-# Celery Configuration
-broker_url = 'redis://localhost:6379/0'
-result_backend = 'redis://localhost:6379/0'
+from celery import Celery
+from config import REDIS_URI, CELERY_EMIT_EVENTS
 
-# Serialization
-task_serializer = 'json'
-accept_content = ['json']
-result_serializer = 'json'
-result_expires = 3600
+celery_app = Celery("webhook", broker=REDIS_URI, include=["tasks"])
 
-# Timezone
-timezone = 'Asia/Kolkata'
-enable_utc = True
+celery_app.conf.update(
+    # Serialization
+    task_serializer='json',
+    accept_content=['json'],
+    task_protocol=2,
+    task_compression='zstd',
+    
+    # Results (all tasks are fire-and-forget, nothing reads them back)
+    task_ignore_result=True,
+    
+    # Timezone
+    timezone='Asia/Kolkata',  
+    enable_utc=True,
+    
+    # Task execution
+    task_time_limit=300,  # 5 minutes hard limit
+    task_soft_time_limit=240,  # 4 minutes soft limit
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+    
+    # Reliability
+    task_reject_on_worker_lost=True,
+    task_acks_on_failure_or_timeout=True,
+    
+    # Performance
+    worker_max_tasks_per_child=100,
+    worker_disable_rate_limits=True,
+    
+    # Monitoring (opt-in, set CELERY_EMIT_EVENTS=1)
+    worker_send_task_events=CELERY_EMIT_EVENTS,
+    task_send_sent_event=CELERY_EMIT_EVENTS,
+    
+    # Connection pool
+    broker_pool_limit=10,
+    broker_connection_retry_on_startup=True,
+    broker_connection_max_retries=10,
+)
 
-# Task execution
-task_track_started = True
-task_time_limit = 300  # 5 minutes hard limit
-task_soft_time_limit = 240  # 4 minutes soft limit
-task_acks_late = True
-worker_prefetch_multiplier = 1
-
-# Reliability
-task_reject_on_worker_lost = True
-task_acks_on_failure_or_timeout = True
-
-# Performance
-worker_max_tasks_per_child = 100
-worker_disable_rate_limits = True
-
-# Monitoring
-worker_send_task_events = True
-task_send_sent_event = True
-
-# Connection pool
-broker_pool_limit = 10
-broker_connection_retry_on_startup = True
-broker_connection_max_retries = 10
-
-# Task routes (already defined in tasks.py, but can override here)
-task_routes = {
-    'tasks.process_message': {'queue': 'messages'},
-    'tasks.check_buffer': {'queue': 'messages'},
-    'tasks.update_message_status': {'queue': 'status'},
+# Task routing
+#
+# Run one worker per queue group. LLM-bound queues use fair scheduling so a
+# long graph run never holds short tasks prefetched behind it; the status
+# queue is tiny, uniform work and can prefetch more aggressively.
+#
+#   celery -A tasks worker -n messages@%h -Q messages -Ofair --prefetch-multiplier=1
+#   celery -A tasks worker -n media@%h -Q media,state -Ofair --prefetch-multiplier=1
+#   celery -A tasks worker -n status@%h -Q status --prefetch-multiplier=8
+celery_app.conf.task_routes = {
+    'tasks.process_message': {
+        'queue': 'messages',
+        'routing_key': 'message.process',
+    },
+    'tasks.check_buffer': {
+        'queue': 'messages',
+        'routing_key': 'message.buffer',
+    },
+    'tasks.update_message_status': {
+        'queue': 'status',
+        'routing_key': 'message.status',
+    },
+    'tasks.update_langgraph_state': {
+        'queue': 'state',  
+        'routing_key': 'state.update',
+    },
+    'tasks.sync_operator_message_to_graph': {
+        'queue': 'state',
+        'routing_key': 'state.sync',
+    },
+    'tasks.process_operator_media': {
+        'queue': 'media', #New task to process operator end uploaded media
+        'routing_key': 'media.process',
+    }
 }
-
-# Result backend settings
-result_backend_transport_options = {
-    'master_name': 'mymaster'
-}
\ No newline at end of file
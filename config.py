@@ -24,6 +24,12 @@ VERIFY_TOKEN=os.getenv("VERIFY_TOKEN")
 DB_URL = os.getenv("DB_URL")
 REDIS_URI = os.getenv("REDIS_URI")
 
+# Celery task events are only useful when Flower/monitoring consumes them
+CELERY_EMIT_EVENTS = os.getenv("CELERY_EMIT_EVENTS", "0") == "1"
+
+# Message dedup via RedisBloom filters instead of one key per message (needs the module)
+DEDUP_USE_BLOOM = os.getenv("DEDUP_USE_BLOOM", "0") == "1"
+
 
 def logger(name):
     logging.basicConfig(format='%(asctime)s,%(msecs)03d %(levelname)-8s [%(filename)s:%(lineno)d] %(message)s', datefmt='%Y-%m-%dT%H:%M:%S', level=logging.DEBUG)
@@ -1,46 +1,28 @@
-from celery import Celery
 from celery.signals import task_failure, task_success
-from config import logger, REDIS_URI
-from utility import message_router
+from config import logger
+from celery_config import celery_app
+from utility import message_router, store_operator_message
 from utility.message_buffer import get_message_buffer
+from utility.whatsapp import upload_media, upload_media_stream, send_media
+from blueprints.operatormsg import open_operator_media_stream, download_operator_media
 from db import engine, message as message_table
 from sqlalchemy import update
 import bot
+import os
 
 _logger = logger(__name__)
 
-celery_app = Celery("webhook", broker=REDIS_URI, backend=REDIS_URI)
 
-celery_app.conf.update(
-    # Serialization
-    task_serializer='json',
-    accept_content=['json'],
-    result_serializer='json',
-    result_expires=3600,  
-    
-    # Timezone
-    timezone='Asia/Kolkata',  
-    enable_utc=True,
-    
-    # Task execution
-    task_track_started=True,
-    task_time_limit=300,
-    task_soft_time_limit=240,
-    task_acks_late=True,
-    worker_prefetch_multiplier=1,
-    
-    # Reliability
-    task_reject_on_worker_lost=True,
-    task_acks_on_failure_or_timeout=True,
-    
-    # Performance
-    worker_max_tasks_per_child=100,
-    worker_disable_rate_limits=True,
-    
-    # Monitoring
-    worker_send_task_events=True,
-    task_send_sent_event=True,
-)
+def _remove_temp_file(file_path: str):
+    """Delete a temp media file"""
+    try:
+        os.unlink(file_path)
+        _logger.info("Cleaned up temp file: %s", file_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        _logger.warning("Failed to clean up temp file %s: %s", file_path, e)
+
 
 @celery_app.task(
     name='tasks.update_langgraph_state',
@@ -61,8 +43,10 @@ def update_langgraph_state_task(self, phone: str, updates: dict):
     Returns:
         dict: Success/failure status
     """
+    task_tag = self.request.id[:8]
+    
     try:
-        _logger.info(f"[Celery-{self.request.id[:8]}] Updating LangGraph state for {phone}")
+        _logger.info("[Celery-%s] Updating LangGraph state for %s", task_tag, phone)
         
         config = {"configurable": {"thread_id": phone}}
         graph = bot.get_graph()
@@ -70,11 +54,11 @@ def update_langgraph_state_task(self, phone: str, updates: dict):
         # Update state
         graph.update_state(config, updates)
         
-        _logger.info(f"[Celery-{self.request.id[:8]}] LangGraph state updated for {phone}")
+        _logger.info("[Celery-%s] LangGraph state updated for %s", task_tag, phone)
         return {"status": "success", "phone": phone, "updates": updates}
         
     except Exception as e:
-        _logger.error(f"[Celery-{self.request.id[:8]}] LangGraph update failed for {phone}: {e}", exc_info=True)
+        _logger.error("[Celery-%s] LangGraph update failed for %s: %s", task_tag, phone, e, exc_info=True)
         raise
 
 
@@ -92,29 +76,28 @@ def sync_operator_message_to_graph_task(self, phone: str, message_text: str):
         phone: User phone number
         message_text: Operator's message content
     """
+    task_tag = self.request.id[:8]
+    
     try:
-        _logger.info(f"[Celery-{self.request.id[:8]}] Syncing operator message to graph for {phone}")
+        _logger.info("[Celery-%s] Syncing operator message to graph for %s", task_tag, phone)
         
         config = {"configurable": {"thread_id": phone}}
         graph = bot.get_graph()
         
-        # Get current state
-        current_state = graph.get_state(config)
-        
-        # Add operator message
         operator_message = {
             "role": "assistant", 
             "content": f"[OPERATOR MESSAGE]: {message_text}"
         }
         
-        updated_messages = current_state.values.get("messages", []) + [operator_message]
-        graph.update_state(config, {"messages": updated_messages})
+        # State.messages uses the add_messages reducer, so sending just the new
+        # message appends it without reading back the whole history
+        graph.update_state(config, {"messages": [operator_message]})
         
-        _logger.info(f"[Celery-{self.request.id[:8]}] Operator message synced to graph for {phone}")
+        _logger.info("[Celery-%s] Operator message synced to graph for %s", task_tag, phone)
         return {"status": "success", "phone": phone}
         
     except Exception as e:
-        _logger.error(f"[Celery-{self.request.id[:8]}] Operator message sync failed for {phone}: {e}", exc_info=True)
+        _logger.error("[Celery-%s] Operator message sync failed for %s: %s", task_tag, phone, e, exc_info=True)
         raise
 
 @celery_app.task(name='tasks.check_buffer')
@@ -122,13 +105,15 @@ def check_buffer_task(phone: str):
     """Check if buffer should be processed for a user"""
     redis_buffer = get_message_buffer()
     
-    _logger.info(f"Checking buffer for {phone}")
+    _logger.info("Checking buffer for %s", phone)
+    
+    should_process, buffer_size, remaining = redis_buffer.get_state(phone)
     
-    if redis_buffer.should_process(phone):
+    if should_process:
         messages = redis_buffer.get_messages(phone)
         
         if messages:
-            _logger.info(f"Processing {len(messages)} buffered messages for {phone}")
+            _logger.info("Processing %s buffered messages for %s", len(messages), phone)
             combined_message = _combine_messages(messages)
             
             process_message_task.apply_async(
@@ -137,37 +122,54 @@ def check_buffer_task(phone: str):
                 priority=5
             )
         else:
-            _logger.warning(f"No messages in buffer for {phone}")
+            _logger.warning("No messages in buffer for %s", phone)
+    elif buffer_size == 0:
+        _logger.info("Buffer for %s already flushed", phone)
     else:
-        buffer_size = redis_buffer.get_buffer_size(phone)
-        _logger.info(f"User {phone} still typing. Buffer size: {buffer_size}. Checking again in 1s")
+        # Wake up exactly when the debounce window closes instead of polling
+        _logger.info("User %s still typing. Buffer size: %s. Checking again in %.1fs", phone, buffer_size, remaining)
         
         check_buffer_task.apply_async(
             args=[phone],
-            countdown=1,
+            countdown=remaining,
             queue='messages',
             priority=5
         )
 
 
 def _combine_messages(messages: list) -> dict:
-    """Combine multiple messages into a single normalized message"""
+    """
+    Combine multiple messages into a single normalized message
+    
+    The originals ride along under 'buffered' so each one is stored
+    with its own message ID.
+    """
     if len(messages) == 1:
         return messages[0]
     
     first_msg = messages[0]
     last_msg = messages[-1]
     
-    text_messages = [m for m in messages if m.get('class') == 'text']
-    media_messages = [m for m in messages if m.get('class') == 'media']
+    # Single pass: collect text in arrival order and remember the last media
+    text_parts = []
+    last_media = None
+    has_text = False
     
-    if text_messages and not media_messages:
-        combined_text = "\n".join([
-            m['from']['message'] 
-            for m in text_messages 
-            if m['from'].get('message')
-        ])
+    for m in messages:
+        msg_class = m.get('class')
+        text = m['from'].get('message')
         
+        if msg_class == 'media':
+            last_media = m
+        elif msg_class == 'text':
+            has_text = True
+        else:
+            continue
+        
+        if text:
+            text_parts.append(text)
+    
+    if last_media is None and has_text:
         return {
             'class': 'text',
             'category': None,
@@ -177,23 +179,14 @@ def _combine_messages(messages: list) -> dict:
                 'phone': first_msg['from']['phone'],
                 'name': first_msg['from']['name'],
                 'message_id': last_msg['from']['message_id'],
-                'message': combined_text,
+                'message': "\n".join(text_parts),
             },
-            'context': last_msg.get('context')
+            'context': last_msg.get('context'),
+            'buffered': messages
         }
     
-    elif media_messages:
-        last_media = media_messages[-1]
-        
-        all_text = []
-        for m in text_messages:
-            if m['from'].get('message'):
-                all_text.append(m['from']['message'])
-        for m in media_messages:
-            if m['from'].get('message'):
-                all_text.append(m['from']['message'])
-        
-        combined_caption = '\n'.join(all_text) if all_text else None
+    elif last_media is not None:
+        media_from = last_media['from']
         
         return {
             'class': 'media',
@@ -201,14 +194,15 @@ def _combine_messages(messages: list) -> dict:
             'type': last_media['type'],
             'timestamp': last_media['timestamp'],
             'from': {
-                'phone': last_media['from']['phone'],
-                'name': last_media['from']['name'],
-                'message_id': last_media['from']['message_id'],
-                'mime_type': last_media['from']['mime_type'],
-                'media_id': last_media['from']['media_id'],
-                'message': combined_caption
+                'phone': media_from['phone'],
+                'name': media_from['name'],
+                'message_id': media_from['message_id'],
+                'mime_type': media_from['mime_type'],
+                'media_id': media_from['media_id'],
+                'message': '\n'.join(text_parts) if text_parts else None
             },
-            'context': last_media.get('context')
+            'context': last_media.get('context'),
+            'buffered': messages
         }
     
     return last_msg
@@ -228,13 +222,14 @@ def process_message_task(self, normalized_data: dict):
     """Background task to process incoming WhatsApp message with AI"""
     phone = normalized_data['from']['phone']
     msg_id = normalized_data['from']['message_id']
+    task_tag = self.request.id[:8]
     
     try:
-        _logger.info(f"[Celery-{self.request.id[:8]}] Processing {msg_id} from {phone}")
+        _logger.info("[Celery-%s] Processing %s from %s", task_tag, msg_id, phone)
         
         message_router(normalized_data)
         
-        _logger.info(f"[Celery-{self.request.id[:8]}] Completed {msg_id}")
+        _logger.info("[Celery-%s] Completed %s", task_tag, msg_id)
         
         return {
             "status": "success",
@@ -244,7 +239,7 @@ def process_message_task(self, normalized_data: dict):
         }
         
     except Exception as e:
-        _logger.error(f"[Celery-{self.request.id[:8]}] Failed {msg_id}: {e}", exc_info=True)
+        _logger.error("[Celery-%s] Failed %s: %s", task_tag, msg_id, e, exc_info=True)
         raise
 
 
@@ -256,10 +251,10 @@ def update_message_status_task(status_data: dict):
         status = status_data.get('status')
         
         if not msg_id or not status:
-            _logger.warning(f"Invalid status data: {status_data}")
+            _logger.warning("Invalid status data: %s", status_data)
             return {"status": "skipped", "reason": "missing_data"}
         
-        _logger.info(f"Updating status for {msg_id}: {status}")
+        _logger.info("Updating status for %s: %s", msg_id, status)
         
         with engine.begin() as conn:
             result = conn.execute(
@@ -269,9 +264,9 @@ def update_message_status_task(status_data: dict):
             )
             
             if result.rowcount > 0:
-                _logger.info(f"Status updated: {msg_id} -> {status}")
+                _logger.info("Status updated: %s -> %s", msg_id, status)
             else:
-                _logger.warning(f"️Message not found: {msg_id}")
+                _logger.warning("️Message not found: %s", msg_id)
         
         return {
             "status": "success",
@@ -280,9 +275,45 @@ def update_message_status_task(status_data: dict):
         }
         
     except Exception as e:
-        _logger.error(f"Status update failed: {e}", exc_info=True)
+        _logger.error("Status update failed: %s", e, exc_info=True)
         return {"status": "failed", "error": str(e)}
 
+
+def _upload_operator_media(media_file_id: str, mime_type: str):
+    """
+    Move operator media from the interface backend to WhatsApp
+    
+    Streams the backend download straight into the WhatsApp upload when its
+    size is known, otherwise falls back to a temp file.
+    
+    Returns:
+        tuple: (media_id or None, media_type)
+    """
+    stream = open_operator_media_stream(media_file_id, mime_type)
+    
+    if stream.get("success"):
+        with stream["response"] as response:
+            media_id = upload_media_stream(
+                response.raw, stream["file_name"], mime_type, stream["file_size"]
+            )
+        return media_id, stream["media_type"]
+    
+    _logger.info("Streaming unavailable (%s), downloading to temp file", stream.get('error'))
+    
+    downloaded_content = download_operator_media(media_file_id, mime_type)
+    
+    if not downloaded_content.get("success"):
+        raise Exception(f"Media download failed: {downloaded_content.get('error')}")
+    
+    file_path = downloaded_content["file_path"]
+    
+    try:
+        return upload_media(file_path), downloaded_content["media_type"]
+    finally:
+        # Clean up temp file
+        _remove_temp_file(file_path)
+
+
 @celery_app.task(
     name='tasks.process_operator_media',
     bind=True,
@@ -308,93 +339,50 @@ def process_operator_media_task(self, phone: str, media_file_id: str, mime_type:
     Returns:
         dict: Status and message_id
     """
-    from blueprints.operatormsg import download_operator_media, get_media_type_and_extension
-    from utility.whatsapp import upload_media, send_media
-    from utility.store_message import store_operator_message
-    import os
+    task_tag = self.request.id[:8]
     
     try:
-        _logger.info(f"[Celery-{self.request.id[:8]}] Processing operator media for {phone}")
+        _logger.info("[Celery-%s] Processing operator media for %s", task_tag, phone)
         
-        # Download media from interface backend
-        downloaded_content = download_operator_media(media_file_id, mime_type)
+        # Pipe media from interface backend to WhatsApp
+        media_id, media_type = _upload_operator_media(media_file_id, mime_type)
+        if not media_id:
+            raise Exception("WhatsApp media upload failed")
         
-        if not downloaded_content.get("success"):
-            raise Exception(f"Media download failed: {downloaded_content.get('error')}")
+        # Send to user
+        response = send_media(media_type, phone, media_id, message_text)
+        message_id = response.get("messages", [{}])[0].get('id') if response else None
         
-        file_path = downloaded_content["file_path"]
-        media_type = downloaded_content["media_type"]
+        # Store in database
+        store_operator_message(
+            message_text, phone, message_id,
+            media_id=media_id,
+            mime_type=mime_type,
+            sender_id=sender_id
+        )
         
-        try:
-            # Upload to WhatsApp
-            media_id = upload_media(file_path)
-            if not media_id:
-                raise Exception("WhatsApp media upload failed")
-            
-            # Send to user
-            response = send_media(media_type, phone, media_id, message_text)
-            message_id = response.get("messages", [{}])[0].get('id') if response else None
-            
-            # Store in database
-            store_operator_message(
-                message_text, phone, message_id,
-                media_id=media_id,
-                mime_type=mime_type,
-                sender_id=sender_id
-            )
-            
-            _logger.info(f"[Celery-{self.request.id[:8]}] Operator media sent successfully")
-            return {
-                "status": "success",
-                "message_id": message_id,
-                "phone": phone
-            }
-            
-        finally:
-            # Clean up temp file
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                _logger.info(f"Cleaned up temp file: {file_path}")
+        _logger.info("[Celery-%s] Operator media sent successfully", task_tag)
+        return {
+            "status": "success",
+            "message_id": message_id,
+            "phone": phone
+        }
                 
     except Exception as e:
-        _logger.error(f"[Celery-{self.request.id[:8]}] Operator media processing failed: {e}", 
+        _logger.error("[Celery-%s] Operator media processing failed: %s", task_tag, e, 
                      exc_info=True)
         raise
 
-# Task routing
-celery_app.conf.task_routes = {
-    'tasks.process_message': {
-        'queue': 'messages',
-        'routing_key': 'message.process',
-    },
-    'tasks.update_message_status': {
-        'queue': 'status',
-        'routing_key': 'message.status',
-    },
-    'tasks.update_langgraph_state': {
-        'queue': 'state',  
-        'routing_key': 'state.update',
-    },
-    'tasks.sync_operator_message_to_graph': {
-        'queue': 'state',
-        'routing_key': 'state.sync',
-    },
-    'tasks.process_operator_media': {
-        'queue': 'media', #New task to process operator end uploaded media
-        'routing_key': 'media.process',
-    }
-}
-
 
 # Monitoring hooks
 @task_failure.connect
 def task_failure_handler(sender=None, task_id=None, exception=None, **kwargs):
     """Log critical failures"""
-    _logger.critical(f"🚨 Task {task_id} failed: {exception}")
+    _logger.critical("🚨 Task %s failed: %s", task_id, exception)
 
 
 @task_success.connect
 def task_success_handler(sender=None, result=None, **kwargs):
     """Log successful completions"""
     if result and isinstance(result, dict) and result.get('status') == 'success':
-        _logger.debug(f"✅ Task completed: {result.get('task_id', 'unknown')[:8]}")
\ No newline at end of file
+        _logger.debug("✅ Task completed: %s", result.get('task_id', 'unknown')[:8])
\ No newline at end of file
@@ -6,7 +6,7 @@ from .handle_with_ai import handle_with_ai, user_input_builder
 from .message_deduplicator import is_duplicate
 from .message_router import message_router
 from .message_buffer import Message_Buffer, get_message_buffer
-from .store_message import store_user_message, store_operator_message, sync_operator_message_to_graph
+from .store_message import store_user_message, store_user_messages_bulk, store_operator_message, sync_operator_message_to_graph
 
 
 from .whatsapp_payload_normalizer import normalize_webhook_payload
@@ -18,6 +18,7 @@ __all__ = [
     'is_duplicate',
     'message_router',
     'store_user_message',
+    'store_user_messages_bulk',
     'store_operator_message',
     'sync_operator_message_to_graph',
     'normalize_webhook_payload',
@@ -3,6 +3,20 @@ import base64
 
 _logger = logger(__name__)
 
+_MEDIA_CONTEXT_PROMPT = """The user's reply message is: {msg}
+Generate a response that takes into account both the content of the {cat} and the user's reply.
+Respond naturally, as if continuing the conversation, without repeating the {cat} description.
+If the user's reply asks a question, answer it using the {cat} context.
+If it's just a reaction, respond in a relevant, concise way."""
+
+_TEXT_CONTEXT_PROMPT = """The user's reply message is: {msg}
+The previous message in the conversation was: {context}
+Generate a response that takes into account both the previous message and the user's reply.
+Respond naturally, as if continuing the conversation, without repeating the previous message.
+If the user's reply asks a question, answer it using the previous message context.
+If it's just a reaction, respond in a relevant, concise way."""
+
+
 def content_formatter(user_input: dict) -> str | list | dict:
     """
     Format user input into content blocks for AI processing
@@ -65,7 +79,8 @@ def _format_contextual(user_input: dict) -> str | list:
 def _format_media_message(user_input: dict) -> list:
     """Format standalone media message"""
     category = user_input["category"]
-    data_string = base64.b64encode(user_input["data"]).decode("utf-8")
+    # base64 output is pure ASCII, so skip the UTF-8 decoder
+    data_string = base64.b64encode(user_input["data"]).decode("ascii")
     mime_type = user_input["mime_type"]
     message_text = user_input.get("message", "")
     
@@ -81,7 +96,7 @@ def _format_media_message(user_input: dict) -> list:
         content_block,
     ]
     
-    _logger.info(f"Media for AI processing - Category: {category}, MIME: {mime_type}")
+    _logger.info(f"Media for AI processing - Category: {category}, MIME: {mime_type}, size={len(user_input['data'])} bytes")
     return content
 
 
@@ -96,7 +111,7 @@ def _format_text_message(user_input: dict) -> str:
 def _format_media_context_reply(user_input: dict) -> list:
     """Format reply to a media message"""
     category = user_input["category"]
-    data_string = base64.b64encode(user_input["data"]).decode("utf-8")
+    data_string = base64.b64encode(user_input["data"]).decode("ascii")
     mime_type = user_input["mime_type"]
     message_text = user_input.get("message", "")
     
@@ -108,18 +123,14 @@ def _format_media_context_reply(user_input: dict) -> list:
     }
     
     # Build contextual prompt
-    prompt = f"""The user's reply message is: {message_text}
-Generate a response that takes into account both the content of the {category} and the user's reply.
-Respond naturally, as if continuing the conversation, without repeating the {category} description.
-If the user's reply asks a question, answer it using the {category} context.
-If it's just a reaction, respond in a relevant, concise way."""
+    prompt = _MEDIA_CONTEXT_PROMPT.format(msg=message_text, cat=category)
     
     content = [
         {"type": "text", "text": prompt},
         content_block
     ]
     
-    _logger.info(f"Media context reply processed - Category: {category}, Message: {message_text}")
+    _logger.info(f"Media context reply processed - Category: {category}, size={len(user_input['data'])} bytes, Message: {message_text}")
     return content
 
 
@@ -128,12 +139,7 @@ def _format_text_context_reply(user_input: dict) -> str:
     context_message = user_input.get("context_message", "")
     message_text = user_input.get("message", "")
     
-    prompt = f"""The user's reply message is: {message_text}
-The previous message in the conversation was: {context_message}
-Generate a response that takes into account both the previous message and the user's reply.
-Respond naturally, as if continuing the conversation, without repeating the previous message.
-If the user's reply asks a question, answer it using the previous message context.
-If it's just a reaction, respond in a relevant, concise way."""
+    prompt = _TEXT_CONTEXT_PROMPT.format(msg=message_text, context=context_message)
     
     _logger.info(f"Text context reply processed - Message: {message_text}")
     return prompt
@@ -1,27 +1,56 @@
 from config import logger
 from db import engine, message
 from sqlalchemy import insert, select
-from datetime import datetime
+from datetime import datetime, timezone
 from bot import stream_graph_updates
 from .whatsapp import send_message, typing_indicator, download_media
-import json
+import orjson
 import time
 
 
 _logger = logger(__name__)
 
-def handle_with_ai(clean_data: dict, conversation_id):
-    """Process user message with AI and store both user and AI messages"""
+# Minimum time the typing indicator is shown before the reply goes out
+TYPING_DELAY = 5
+
+# MIME top-level type -> media category (anything else is a file)
+MEDIA_CATEGORIES = {"image": "image", "video": "video", "audio": "audio"}
+
+# Default for context_row: the caller didn't look it up (None means it looked and found nothing)
+_NOT_FETCHED = object()
+
+def fetch_context_row(conn, clean_data: dict):
+    """Look up the message a text reply refers to (if any) on an existing connection"""
+    if clean_data["class"] != "text" or not clean_data.get("context"):
+        return None
+    result = conn.execute(select(message.c.message_text, message.c.media_info).where(message.c.external_id == clean_data["context"]["id"]))
+    return result.mappings().first()
+
+
+def handle_with_ai(clean_data: dict, conversation_id, context_row=_NOT_FETCHED):
+    """Process user message with AI and store both user and AI messages
+    
+    Args:
+        clean_data: Normalized message data
+        conversation_id: ID of the conversation
+        context_row: Replied-to message (None if not found), if the caller already fetched it
+    """
     
     start_time = time.time()
-    user_input = user_input_builder(clean_data)
+
+    # Show typing while the model works, so its latency counts toward the delay
+    typing_indicator(clean_data["from"]["message_id"])
+    typing_started = time.time()
+
+    user_input = user_input_builder(clean_data, context_row)
     ai_response = stream_graph_updates(clean_data["from"]["phone"], user_input)
 
     ai_message = ai_response.get("content")
     ai_metadata = ai_response.get("metadata")
 
-    typing_indicator(clean_data["from"]["message_id"])
-    time.sleep(5)
+    remaining_delay = TYPING_DELAY - (time.time() - typing_started)
+    if remaining_delay > 0:
+        time.sleep(remaining_delay)
 
     response = send_message(clean_data["from"]["phone"], ai_message)
 
@@ -33,7 +62,7 @@ def handle_with_ai(clean_data: dict, conversation_id):
             "external_id": response["messages"][0]['id'],
             "has_text": True,
             "message_text": ai_message,
-            "provider_ts": datetime.fromtimestamp(int(time.time())),
+            "provider_ts": datetime.now(timezone.utc),
             "extra_metadata": ai_metadata
         }
 
@@ -49,27 +78,28 @@ def handle_with_ai(clean_data: dict, conversation_id):
             _logger.error(f"Failed to insert in DataBase: {e}")
 
 
-def user_input_builder(clean_data: dict) -> dict:
+def user_input_builder(clean_data: dict, context_row=_NOT_FETCHED) -> dict:
     user_input = {}
     if clean_data["class"] == "text":
         if clean_data["context"]:
-                with engine.begin() as conn:
-                    result = conn.execute(select(message.c.message_text, message.c.media_info).where(message.c.external_id == clean_data["context"]["id"]))
-                    row = result.mappings().first()
+                row = context_row
+                if row is _NOT_FETCHED:
+                    with engine.connect() as conn:
+                        row = fetch_context_row(conn, clean_data)
                 if row and row["media_info"]:
-                    media_info = json.loads(row["media_info"])
+                    media_info = orjson.loads(row["media_info"])
                     downloaded_data =  download_media(media_info["id"])
                     user_input =  {
                                 "context": True,
                                 "context_type": "media",
                                 "data": downloaded_data['data'], 
-                                "category": "image" if media_info["mime_type"].startswith("image/") else "video" if media_info["mime_type"].startswith("video/") else "audio" if media_info["mime_type"].startswith("audio/") else "file",
+                                "category": MEDIA_CATEGORIES.get(media_info["mime_type"].split("/", 1)[0], "file"),
                                 "content_type": downloaded_data['content_type'],
                                 "mime_type": downloaded_data['mime_type'],
                                 "message": clean_data["from"]["message"]
                             }
                     
-                elif row["message_text"]:
+                elif row and row["message_text"]:
                     user_input = {
                         "context": True,
                         "context_type": "text",
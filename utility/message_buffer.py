@@ -1,7 +1,7 @@
 import redis
-import json
+import orjson
 import time
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from config import REDIS_URI, logger
 
 _logger = logger(__name__)
@@ -34,23 +34,17 @@ class Message_Buffer:
         buffer_key = self._get_buffer_key(phone)
         timer_key = self._get_timer_key(phone)
         
-        # Check if buffer exists
-        buffer_exists = self.redis_client.exists(buffer_key)
+        # Push, refresh expiry and stamp the timer in one round trip
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.rpush(buffer_key, orjson.dumps(normalized_message))
+        pipe.expire(buffer_key, int(self.max_wait_time))
+        pipe.set(timer_key, time.time(), ex=int(self.max_wait_time))
+        buffer_size, _, _ = pipe.execute()
         
-        # Add message to list
-        self.redis_client.rpush(buffer_key, json.dumps(normalized_message))
-        
-        # Set expiry (max_wait_time)
-        self.redis_client.expire(buffer_key, int(self.max_wait_time))
-        
-        # Update last message timestamp
-        self.redis_client.set(timer_key, time.time(), ex=int(self.max_wait_time))
-        
-        if not buffer_exists:
+        if buffer_size == 1:
             _logger.info(f"Started message buffer for {phone}")
             return True
         else:
-            buffer_size = self.redis_client.llen(buffer_key)
             _logger.info(f"Added to buffer for {phone}. Total: {buffer_size}")
             return False
     
@@ -71,6 +65,26 @@ class Message_Buffer:
         
         return time_since_last >= self.debounce_time
     
+    def get_state(self, phone: str) -> Tuple[bool, int, float]:
+        """
+        Check readiness and buffer size in a single Redis round trip
+        
+        Returns:
+            (should_process, buffer_size, seconds until the debounce window closes)
+        """
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.get(self._get_timer_key(phone))
+        pipe.llen(self._get_buffer_key(phone))
+        last_message_time, buffer_size = pipe.execute()
+        
+        if not last_message_time:
+            # Timer gone: either nothing is buffered or the debounce is long past
+            return buffer_size > 0, buffer_size, 0.0
+        
+        remaining = self.debounce_time - (time.time() - float(last_message_time))
+        
+        return remaining <= 0, buffer_size, max(remaining, 0.0)
+    
     def get_messages(self, phone: str) -> Optional[List[dict]]:
         """
         Get all buffered messages for a user and clear the buffer
@@ -81,18 +95,17 @@ class Message_Buffer:
         buffer_key = self._get_buffer_key(phone)
         timer_key = self._get_timer_key(phone)
         
-        # Get all messages
-        messages_json = self.redis_client.lrange(buffer_key, 0, -1)
+        # Read and clear atomically so nothing pushed in between is lost
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.lrange(buffer_key, 0, -1)
+        pipe.delete(buffer_key, timer_key)
+        messages_json, _ = pipe.execute()
         
         if not messages_json:
             return None
         
         # Parse messages
-        messages = [json.loads(msg) for msg in messages_json]
-        
-        # Clear buffer
-        self.redis_client.delete(buffer_key)
-        self.redis_client.delete(timer_key)
+        messages = [orjson.loads(msg) for msg in messages_json]
         
         _logger.info(f"Retrieved {len(messages)} messages for {phone}")
         return messages
@@ -1,10 +1,21 @@
 import redis
-from config import REDIS_URI, logger
+import time
+from collections import OrderedDict
+from config import REDIS_URI, DEDUP_USE_BLOOM, logger
 
 _logger = logger(__name__)
 
-message_cache = {}
+# In-process cache in front of Redis (and fallback when Redis is down),
+# insertion-ordered so expiry only inspects the oldest entry
+message_cache = OrderedDict()
 CACHE_DURATION = 120
+LOCAL_CACHE_MAX = 4096
+
+# Bloom filters are rotated per CACHE_DURATION window (old ones expire), which
+# bounds their size and false-positive growth without a cleanup timer
+BLOOM_CAPACITY = 1_000_000
+BLOOM_ERROR_RATE = 1e-6
+_bloom_enabled = DEDUP_USE_BLOOM
 
 _logger.info("Establishing Redis connection")
 
@@ -16,13 +27,71 @@ else:
     _logger.error("Redis ping failed")
 
 
+def _expire_local(current_time: float):
+    """Drop expired entries from the oldest end; amortized O(1) per call"""
+    while message_cache and current_time - next(iter(message_cache.values())) > CACHE_DURATION:
+        message_cache.popitem(last=False)
+
+
+def _remember_local(cache_key: tuple, current_time: float):
+    """Record a message in the local cache, evicting the oldest past LOCAL_CACHE_MAX"""
+    message_cache[cache_key] = current_time
+    if len(message_cache) > LOCAL_CACHE_MAX:
+        message_cache.popitem(last=False)
+
+
+def _is_duplicate_bloom(cache_key: str) -> bool:
+    """Check-and-add against the current and previous window filters in one round trip"""
+    window = int(time.time() // CACHE_DURATION)
+    current_key = f"msg_dedup_bf:{window}"
+    previous_key = f"msg_dedup_bf:{window - 1}"
+    
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.execute_command("BF.EXISTS", previous_key, cache_key)
+    pipe.execute_command(
+        "BF.INSERT", current_key,
+        "CAPACITY", BLOOM_CAPACITY, "ERROR", BLOOM_ERROR_RATE,
+        "ITEMS", cache_key
+    )
+    pipe.expire(current_key, CACHE_DURATION * 2)
+    seen_before, (added,), _ = pipe.execute()
+    
+    return bool(seen_before) or not added
+
+
 def is_duplicate(wa_message_id: str, user_phone: str) -> bool:
+    global _bloom_enabled
+
+    # Provider retries usually land on the same worker; catch them without a round trip
+    current_time = time.time()
+    _expire_local(current_time)
+    local_key = (user_phone, wa_message_id)
+
+    if local_key in message_cache:
+        _logger.info(f" Duplicate message (local): {user_phone}:{wa_message_id}")
+        return True
 
-    cache_key = f"msg_dedup:{user_phone}:{wa_message_id}"
+    cache_key = "msg_dedup:" + user_phone + ":" + wa_message_id
+
+    if _bloom_enabled:
+        try:
+            duplicate = _is_duplicate_bloom(cache_key)
+            _logger.info(f" {'Duplicate' if duplicate else 'New'} message: {cache_key}")
+            _remember_local(local_key, current_time)
+            return duplicate
+        except redis.ResponseError as e:
+            # RedisBloom not loaded on this server, stay on SET NX from now on
+            _logger.error("Bloom dedup unavailable, falling back to SET NX: %s", e)
+            _bloom_enabled = False
+        except Exception as e:
+            _logger.error("Redis deduplication failed, using in-process cache: %s", e)
+            return is_duplicate_message(wa_message_id, user_phone)
 
     try:
         set_new_message = redis_client.set(cache_key, "1", nx=True, ex=CACHE_DURATION)
 
+        _remember_local(local_key, current_time)
+
         if set_new_message:
             _logger.info(f" New message: {cache_key}")
             return False
@@ -31,10 +100,35 @@ def is_duplicate(wa_message_id: str, user_phone: str) -> bool:
             _logger.info(f" Duplicate message: {cache_key}")
             return True
     except Exception as e:
-        _logger.error("Deduplication failed: {e}")
+        _logger.error("Redis deduplication failed, using in-process cache: %s", e)
+        return is_duplicate_message(wa_message_id, user_phone)
+
+
+def is_duplicate_message(msg_id: str, user_ph: str) -> bool:
+    """In-process deduplication (per worker), used when Redis is unavailable"""
+    current_time = time.time()
+    _expire_local(current_time)
+    
+    # Tuple key: no string formatting, and no ambiguity if either part contains "_"
+    cache_key = (user_ph, msg_id)
+    
+    if cache_key in message_cache:
+        _logger.info(f" Duplicate message: {user_ph}:{msg_id}")
+        return True
+    
+    _remember_local(cache_key, current_time)
+    return False
 
 
 def get_dedup_stats():
+    if _bloom_enabled:
+        return {
+            "backend": "redis-bloom",
+            "cache_duration": CACHE_DURATION,
+            "capacity": BLOOM_CAPACITY,
+            "error_rate": BLOOM_ERROR_RATE,
+            "status": "healthy"
+        }
     try:
         keys = redis_client.keys("msg_dedup:*")
         return {
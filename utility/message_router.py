@@ -1,15 +1,34 @@
 from config import logger
 from db import engine, conversation
-from sqlalchemy import select, insert
-from .store_message import store_user_message
-from .handle_with_ai import handle_with_ai
+from sqlalchemy import literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from .store_message import store_user_message, store_user_messages_bulk
+from .handle_with_ai import handle_with_ai, fetch_context_row
 
 _logger = logger(__name__)
 
+def _store_inbound(normalized_data: dict, conversation_id: int, conn=None):
+    """Store the inbound message(s); a flushed buffer stores every original message"""
+    buffered = normalized_data.get("buffered")
+    if buffered:
+        store_user_messages_bulk(buffered, conversation_id, conn=conn)
+    else:
+        store_user_message(normalized_data, conversation_id, conn=conn)
+
+
+# (newly created, human intervention required) -> (run AI, log, status, HTTP code)
+_ROUTE_TABLE = {
+    (True, False): (True, "New conversation started with ID: {}", "New conversation started and processed with AI", 200),
+    (True, True): (True, "New conversation started with ID: {}", "New conversation started and processed with AI", 200),
+    (False, True): (False, "Operator intervention required for conversation ID: {}", "Operator intervention required", 200),
+    (False, False): (True, "Processing message for conversation ID: {}", "Message processed with AI", 200),
+}
+
+
 def message_router(normalized_data: dict):
     """Route message to AI or store directly based on conversation state
-    1. Check if conversation exists
-    2. If not, create new conversation, store message, process with AI
+    1. Get or create the conversation (single upsert)
+    2. If newly created, store message, process with AI
     3. If exists, check if human intervention is requested
         a. If yes, store message and notify operator
         b. If no, store message and process with AI
@@ -22,45 +41,42 @@ def message_router(normalized_data: dict):
         int: HTTP status code
     """
     try: 
-        conversation_id = None
-        row = None
-        with engine.begin() as conn:
-            result_obj = conn.execute(select(conversation.c.id, conversation.c.human_intervention_required).where(conversation.c.phone == f"{normalized_data['from']['phone']}"))
-            row = result_obj.mappings().first()
-
-            if not row:
-                # New conversation
-                result = conn.execute(insert(conversation).values({"phone": normalized_data["from"]["phone"], "name": normalized_data["from"]["name"]}).returning(conversation.c.id))
-                conversation_id = result.scalar_one()
+        phone = normalized_data["from"]["phone"]
+        name = normalized_data["from"]["name"]
 
-                _logger.info(f"New conversation started with ID: {conversation_id}")
-                
-                # Store message to DB
-                store_user_message(normalized_data, conversation_id, conn=conn)
-                
-        
-        if not row:
-            # Process with AI
-            handle_with_ai(normalized_data, conversation_id)
-            return "New conversation started and processed with AI", 200
+        # Get-or-create the conversation in one statement; xmax = 0 only on a fresh insert
+        upsert = (
+            pg_insert(conversation)
+            .values(phone=phone, name=name)
+            .on_conflict_do_update(index_elements=[conversation.c.phone], set_={"name": name})
+            .returning(
+                conversation.c.id,
+                conversation.c.human_intervention_required,
+                literal_column("(xmax = 0)").label("inserted"),
+            )
+        )
 
-        elif row:
+        # One transaction for the upsert, the inbound store and the reply-context
+        # lookup; the AI call itself runs after commit so no connection is held
+        with engine.begin() as conn:
+            row = conn.execute(upsert).mappings().one()
             conversation_id = row["id"]
-            interrupt_required = row["human_intervention_required"]
-
-            if interrupt_required:
-                # Existing conversation but needs human intervention
-                _logger.info(f"Operator intervention required for conversation ID: {conversation_id}")
-                # Store message happens inside its own transaction
-                store_user_message(normalized_data, conversation_id)
-                return "Operator intervention required", 200
-            else:
-                # Existing conversation, process with AI
-                _logger.info(f"Processing message for conversation ID: {conversation_id}")  
-                store_user_message(normalized_data, conversation_id)
-                handle_with_ai(normalized_data, conversation_id)
-                return "Message processed with AI", 200
-        return
+            
+            run_ai, log_template, status, code = _ROUTE_TABLE[
+                (row["inserted"], row["human_intervention_required"])
+            ]
+            
+            # Every outcome stores the inbound message(s) first
+            _store_inbound(normalized_data, conversation_id, conn=conn)
+            
+            context_row = fetch_context_row(conn, normalized_data) if run_ai else None
+        
+        _logger.info(log_template.format(conversation_id))
+        
+        if run_ai:
+            handle_with_ai(normalized_data, conversation_id, context_row=context_row)
+        
+        return status, code
 
     except Exception as e:
         _logger.error(f"Database error: {e}")
@@ -1,12 +1,39 @@
 from config import logger
 from db import engine, message, conversation
-from sqlalchemy import insert, select
-from datetime import datetime
-import json
-import time
+from sqlalchemy import insert, select, cast
+from sqlalchemy.exc import NoResultFound
+from datetime import datetime, timezone
+import orjson
 
 _logger = logger(__name__)
 
+def _user_message_row(clean_data: dict, conversation_id: int, now: datetime = None) -> dict:
+    """Build the message table row for an inbound user message"""
+    sender = clean_data['from']
+    text = sender.get('message')
+    media_id = sender.get('media_id')
+    mime_type = sender.get('mime_type')
+    context = clean_data.get("context")
+    
+    return {
+        "conversation_id": conversation_id,
+        "direction": "inbound",
+        "sender_type": "customer", 
+        "external_id": str(sender.get('message_id')),
+        "has_text": True if text else False,
+        "message_text": text if isinstance(text, str) else None,
+
+        "media_info": orjson.dumps({
+                "id": media_id,
+                "mime_type": mime_type,
+                "description": ""
+            }).decode() if media_id or mime_type else None,
+
+        "provider_ts": now or datetime.now(timezone.utc),
+        "extra_metadata": orjson.dumps({"context": context}).decode() if context else None
+    }
+
+
 def store_user_message(clean_data: dict, conversation_id: int, conn=None):
     """Store user message without AI processing
     
@@ -16,32 +43,42 @@ def store_user_message(clean_data: dict, conversation_id: int, conn=None):
         conn: Optional database connection (for reusing transaction)
     """
     
-    row = {
-        "conversation_id": conversation_id,
-        "direction": "inbound",
-        "sender_type": "customer", 
-        "external_id": str(clean_data['from'].get('message_id')),
-        "has_text": True if clean_data['from'].get('message') else False,
-        "message_text": clean_data['from'].get('message') if isinstance(clean_data['from'].get('message'), str) else None,
+    row = _user_message_row(clean_data, conversation_id)
 
-        "media_info": json.dumps({
-                "id": clean_data['from'].get('media_id'),
-                "mime_type": clean_data['from'].get('mime_type'),
-                "description": ""
-            }) if clean_data['from'].get('media_id') or clean_data['from'].get('mime_type') else None,
+    try:
+        if conn:
+            # Savepoint: a failed insert must not abort the caller's transaction
+            with conn.begin_nested():
+                conn.execute(insert(message).values(row))
+        else:
+            with engine.begin() as conn:
+                conn.execute(insert(message).values(row))
+    except Exception as e:
+        _logger.error("Failed to insert into DataBase: %s", e)
 
-        "provider_ts": datetime.fromtimestamp(int(time.time())),
-        "extra_metadata": json.dumps({"context": clean_data.get("context")}) if clean_data.get("context") else None
-    }
+
+def store_user_messages_bulk(clean_data_list: list, conversation_id: int, conn=None):
+    """Store several user messages in one executemany round trip
+    
+    Args:
+        clean_data_list: Normalized message data, in arrival order
+        conversation_id: ID of the conversation
+        conn: Optional database connection (for reusing transaction)
+    """
+    
+    now = datetime.now(timezone.utc)
+    rows = [_user_message_row(clean_data, conversation_id, now) for clean_data in clean_data_list]
 
     try:
         if conn:
-            conn.execute(insert(message).values(row))
+            # Savepoint: a failed insert must not abort the caller's transaction
+            with conn.begin_nested():
+                conn.execute(insert(message), rows)
         else:
             with engine.begin() as conn:
-                conn.execute(insert(message).values(row))
+                conn.execute(insert(message), rows)
     except Exception as e:
-        _logger.error(f"Failed to insert into DataBase: {e}")
+        _logger.error("Failed to bulk insert into DataBase: %s", e)
 
 
 def store_operator_message(message_text: str, user_ph: str, external_msg_id: str = None, **kwargs):
@@ -62,30 +99,38 @@ def store_operator_message(message_text: str, user_ph: str, external_msg_id: str
     from tasks import sync_operator_message_to_graph_task
     
     with engine.begin() as conn:
-        # Get conversation
-        result = conn.execute(
-            select(conversation.c.id).where(conversation.c.phone == str(user_ph))
-        )
-        conversation_id = result.scalar_one()
+        media_id = kwargs.get("media_id")
+        mime_type = kwargs.get("mime_type")
         
-        # Store in database
         row = {
-            "conversation_id": conversation_id,
             "direction": "outbound",
             "sender_type": "operator",
             "sender_id": kwargs.get("sender_id"),
             "external_id": external_msg_id,
             "has_text": True,
-            "media_info": json.dumps({
-                    "id": kwargs.get("media_id"),
-                    "mime_type": kwargs.get("mime_type"),
+            "media_info": orjson.dumps({
+                    "id": media_id,
+                    "mime_type": mime_type,
                     "description": ""
-                }) if kwargs.get("media_id") or kwargs.get("mime_type") else None,
+                }).decode() if media_id or mime_type else None,
             "message_text": message_text,
-            "provider_ts": datetime.fromtimestamp(int(time.time())),
+            "provider_ts": datetime.now(timezone.utc),
         }
-        conn.execute(insert(message).values(row))
-        _logger.info(f"Operator message stored in DB for {user_ph}")
+        
+        # Resolve the conversation and insert in one INSERT ... SELECT. Values are
+        # bound with the column types (same encoding as a VALUES insert) and cast,
+        # since enum/JSONB columns don't coerce from a SELECT list
+        stmt = insert(message).from_select(
+            ["conversation_id", *row],
+            select(
+                conversation.c.id,
+                *(cast(value, message.c[column].type) for column, value in row.items())
+            ).where(conversation.c.phone == str(user_ph))
+        ).returning(message.c.id)
+        
+        if conn.execute(stmt).first() is None:
+            raise NoResultFound(f"No conversation found for {user_ph}")
+        _logger.info("Operator message stored in DB for %s", user_ph)
     
     # CRITICAL FIX: Offload graph sync to Celery
     # This prevents blocking on LangGraph state updates
@@ -94,7 +139,7 @@ def store_operator_message(message_text: str, user_ph: str, external_msg_id: str
         queue='state',
         priority=7  # High priority (but lower than takeover/handback)
     )
-    _logger.info(f"Queued operator message sync to graph for {user_ph}")
+    _logger.info("Queued operator message sync to graph for %s", user_ph)
 
 
 def sync_operator_message_to_graph(user_ph: str, message_text: str):
@@ -4,7 +4,7 @@ WhatsApp Business API Client Package
 
 from .client import WhatsAppClient
 from .messaging import send_message, typing_indicator
-from .media import upload_media, upload_video, send_media, download_media, get_url
+from .media import upload_media, upload_media_stream, upload_video, send_media, download_media, get_url
 
 __all__ = [
     'WhatsAppClient',
@@ -12,6 +12,7 @@ __all__ = [
     'typing_indicator',
     'upload_video',
     'upload_media',
+    'upload_media_stream',
     'send_media',
     'download_media',
     'get_url',
@@ -2,9 +2,13 @@
 WhatsApp API Client - Object-oriented interface
 """
 
-from typing import Optional, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Tuple
 from . import messaging, media
 
+# Upper bound on parallel sends; the shared session pools 32 connections
+MAX_PARALLEL_SENDS = 16
+
 
 class WhatsAppClient:
     """
@@ -21,6 +25,23 @@ class WhatsAppClient:
         """Send a text message"""
         return messaging.send_message(to, message)
     
+    def send_many(self, targets: List[Tuple[str, str]]) -> List[Optional[dict]]:
+        """
+        Send text messages to several recipients in parallel
+        
+        Args:
+            targets: (recipient phone, message) pairs
+        
+        Returns:
+            One response (or None) per target, in the same order
+        """
+        if not targets:
+            return []
+        
+        # Sends are network-bound, so threads overlap the Graph API latency
+        with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_SENDS, len(targets))) as executor:
+            return list(executor.map(lambda target: messaging.send_message(*target), targets))
+    
     def send_typing_indicator(self, msg_id: str) -> bool:
         """Send typing indicator"""
         return messaging.typing_indicator(msg_id)
@@ -2,6 +2,9 @@
 Configuration and constants for WhatsApp API client
 """
 
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from config import WHATSAPP_PHONE_NUMBER_ID, WHATSAPP_ACCESS_TOKEN, WHATSAPP_GRAPH_URL
 
 # API Configuration
@@ -17,13 +20,43 @@ ERROR_MAPPINGS = {
     368: "Temporarily blocked due to policy violations.",
 }
 
+# Graph API throttling: retry 429s after the server's Retry-After (or exponential
+# backoff). Only 429 is retried because a POST that hit a 5xx may already have
+# been delivered. The last response is returned rather than raised so callers
+# keep their normal error handling.
+GRAPH_RETRY = Retry(
+    total=5,
+    connect=3,
+    read=0,
+    backoff_factor=0.5,
+    status_forcelist=[429],
+    allowed_methods=frozenset(["GET", "POST"]),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+
+# Shared HTTP session so Graph API calls reuse keep-alive TLS connections
+# instead of paying a fresh handshake per request
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=GRAPH_RETRY))
+
+# Streamed /media uploads can't be rewound (MultipartEncoder has no tell()), so a
+# retry would resend the headers with an empty body. Uploads use their own
+# session with retries disabled.
+upload_session = requests.Session()
+upload_session.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=8, max_retries=0))
+
+# The token is fixed for the life of the process, so build the headers once
+HEADERS = {
+    "Authorization": f"Bearer {WHATSAPP_ACCESS_TOKEN}",
+    "Content-Type": "application/json",
+}
+AUTH_HEADER = {"Authorization": HEADERS["Authorization"]}
+
 def get_headers():
     """Returns the authorization headers for API requests"""
-    return {
-        "Authorization": f"Bearer {WHATSAPP_ACCESS_TOKEN}",
-        "Content-Type": "application/json",
-    }
+    return HEADERS
 
 def get_auth_header():
     """Returns only the authorization header (for file uploads)"""
-    return {"Authorization": f"Bearer {WHATSAPP_ACCESS_TOKEN}"}
+    return AUTH_HEADER
@@ -2,16 +2,50 @@
 WhatsApp media handling functions (upload, send, download)
 """
 import os
-import json
+import orjson
 import requests
 import mimetypes
-from typing import Optional, Dict
+from typing import Optional, Dict, BinaryIO
+from requests_toolbelt.multipart.encoder import MultipartEncoder
 from config import logger
-from .constants import API_BASE, BASE_URL, get_headers, get_auth_header
+from .constants import API_BASE, BASE_URL, HEADERS, AUTH_HEADER, session, upload_session
 from .errors import handle_error
 
 _logger = logger(__name__)
 
+# Chunk size when streaming a media download into memory or a caller-supplied sink
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Extension -> MIME type for every media type WhatsApp accepts
+_MIME_MAP = {
+    # Images
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.webp': 'image/webp',
+    
+    # Videos
+    '.mp4': 'video/mp4',
+    '.3gp': 'video/3gpp',
+    
+    # Audio
+    '.aac': 'audio/aac',
+    '.m4a': 'audio/mp4',
+    '.mp3': 'audio/mpeg',
+    '.amr': 'audio/amr',
+    '.ogg': 'audio/ogg',
+    
+    # Documents
+    '.pdf': 'application/pdf',
+    '.doc': 'application/msword',
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    '.xls': 'application/vnd.ms-excel',
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.ppt': 'application/vnd.ms-powerpoint',
+    '.pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+}
+
+
 def get_mime_type(file_path: str) -> str:
     """
     Detect MIME type from file path
@@ -22,44 +56,63 @@ def get_mime_type(file_path: str) -> str:
     Returns:
         MIME type string
     """
-    # Try to guess from extension
-    mime_type, _ = mimetypes.guess_type(file_path)
+    # Known WhatsApp types first; mimetypes reads the system tables on first use
+    ext = os.path.splitext(file_path)[1].lower()
+    mime_type = _MIME_MAP.get(ext)
     
     if mime_type:
         return mime_type
     
-    # Fallback: detect from extension manually
-    ext = os.path.splitext(file_path)[1].lower()
+    mime_type, _ = mimetypes.guess_type(file_path)
     
-    mime_map = {
-        # Images
-        '.jpg': 'image/jpeg',
-        '.jpeg': 'image/jpeg',
-        '.png': 'image/png',
-        '.webp': 'image/webp',
-        
-        # Videos
-        '.mp4': 'video/mp4',
-        '.3gp': 'video/3gpp',
-        
-        # Audio
-        '.aac': 'audio/aac',
-        '.m4a': 'audio/mp4',
-        '.mp3': 'audio/mpeg',
-        '.amr': 'audio/amr',
-        '.ogg': 'audio/ogg',
-        
-        # Documents
-        '.pdf': 'application/pdf',
-        '.doc': 'application/msword',
-        '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-        '.xls': 'application/vnd.ms-excel',
-        '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        '.ppt': 'application/vnd.ms-powerpoint',
-        '.pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
-    }
+    return mime_type or 'application/octet-stream'
+
+
+class _SizedStream:
+    """
+    File-like wrapper exposing the remaining length of a non-seekable stream
+    
+    MultipartEncoder needs the part size up front to compute Content-Length;
+    this lets it read straight from an HTTP response without buffering.
+    """
+    
+    def __init__(self, raw: BinaryIO, length: int):
+        self._raw = raw
+        self._remaining = length
     
-    return mime_map.get(ext, 'application/octet-stream')
+    @property
+    def len(self) -> int:
+        return self._remaining
+    
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._raw.read(size if size and size > 0 else None)
+        if not chunk and self._remaining:
+            raise IOError(f"Stream ended with {self._remaining} bytes still expected")
+        self._remaining -= len(chunk)
+        return chunk
+
+
+def _handle_upload_response(response: requests.Response, file_name: str) -> Optional[str]:
+    """Parse a /media upload response and return the media ID"""
+    _logger.info("Media upload response: %s", response.status_code)
+    
+    if response.ok:
+        response_data = orjson.loads(response.content)
+        media_id = response_data.get("id")
+        _logger.info("Media uploaded successfully: %s (ID: %s)", file_name, media_id)
+        _logger.debug("Response JSON: %s", response_data)
+        return media_id
+    
+    # Handle error
+    _logger.error("Media upload failed. Status: %s", response.status_code)
+    try:
+        error_obj = orjson.loads(response.content)
+        _logger.error("Error response: %s", error_obj)
+        handle_error(error_obj)
+    except ValueError:
+        _logger.error("Response not valid JSON: %s", response.text)
+    
+    return None
 
 
 def upload_media(file_path: str) -> Optional[str]:
@@ -80,54 +133,37 @@ def upload_media(file_path: str) -> Optional[str]:
         >>> media_id = upload_media("/path/to/video.mp4")
         >>> media_id = upload_media("/path/to/audio.mp3")
     """
-    # Validate file exists
-    if not os.path.exists(file_path):
-        _logger.error("File not found: %s", file_path)
-        return None
-    
     # Detect MIME type
     mime_type = get_mime_type(file_path)
     file_name = os.path.basename(file_path)
     
-    _logger.info(f"Uploading file: {file_name} (MIME: {mime_type})")
-    
     url = f"{API_BASE}/media"
-    headers = get_auth_header()
     
-    # Open file for upload
-    file_handle = None
+    # Open directly instead of checking first: one syscall, no race
     try:
         file_handle = open(file_path, "rb")
-        
-        files = {
-            "file": (file_name, file_handle, mime_type)
-        }
-        
-        data = {
-            "messaging_product": "whatsapp"
-        }
-        
-        # Upload
-        response = requests.post(url, headers=headers, files=files, data=data)
-        _logger.info("Media upload response: %s", response.status_code)
-        
-        if response.ok:
-            response_data = response.json()
-            media_id = response_data.get("id")
-            _logger.info("Media uploaded successfully: %s (ID: %s)", file_name, media_id)
-            _logger.debug("Response JSON: %s", response_data)
-            return media_id
-        
-        # Handle error
-        _logger.error("Media upload failed. Status: %s", response.status_code)
-        try:
-            error_obj = response.json()
-            _logger.error("Error response: %s", json.dumps(error_obj, indent=2))
-            handle_error(error_obj)
-        except ValueError:
-            _logger.error("Response not valid JSON: %s", response.text)
-        
+    except FileNotFoundError:
+        _logger.error("File not found: %s", file_path)
         return None
+    
+    _logger.info("Uploading file: %s (MIME: %s)", file_name, mime_type)
+    
+    try:
+        with file_handle:
+            # Stream the file from disk in chunks; files= would build the whole
+            # multipart body in memory first
+            encoder = MultipartEncoder(fields={
+                "messaging_product": "whatsapp",
+                "file": (file_name, file_handle, mime_type),
+            })
+            
+            # Copy: AUTH_HEADER is shared across calls
+            headers = {**AUTH_HEADER, "Content-Type": encoder.content_type}
+            
+            # Upload
+            response = upload_session.post(url, headers=headers, data=encoder)
+        
+        return _handle_upload_response(response, file_name)
         
     except requests.RequestException as e:
         _logger.exception("Media upload request failed: %s", str(e))
@@ -136,12 +172,45 @@ def upload_media(file_path: str) -> Optional[str]:
     except Exception as e:
         _logger.exception("Unexpected error during upload: %s", str(e))
         return None
+
+
+def upload_media_stream(stream: BinaryIO, file_name: str, mime_type: str, file_size: int) -> Optional[str]:
+    """
+    Upload media to WhatsApp directly from a readable stream
+    
+    The stream is piped into the multipart body in chunks, so the media is
+    never written to disk or held in memory in full.
+    
+    Args:
+        stream: Readable binary stream (e.g. a raw HTTP response)
+        file_name: File name reported to WhatsApp
+        mime_type: MIME type of the media
+        file_size: Exact size of the stream in bytes
+        
+    Returns:
+        Media ID if successful, None otherwise
+    """
+    _logger.info("Streaming upload: %s (MIME: %s, %s bytes)", file_name, mime_type, file_size)
+    
+    encoder = MultipartEncoder(fields={
+        "messaging_product": "whatsapp",
+        "file": (file_name, _SizedStream(stream, file_size), mime_type),
+    })
+    
+    # Copy: AUTH_HEADER is shared across calls
+    headers = {**AUTH_HEADER, "Content-Type": encoder.content_type}
+    
+    try:
+        response = upload_session.post(f"{API_BASE}/media", headers=headers, data=encoder)
+        return _handle_upload_response(response, file_name)
+        
+    except requests.RequestException as e:
+        _logger.exception("Streaming media upload request failed: %s", str(e))
+        return None
         
-    finally:
-        # Always close file handle
-        if file_handle:
-            file_handle.close()
-            _logger.debug("File handle closed for: %s", file_path)
+    except Exception as e:
+        _logger.exception("Unexpected error during streaming upload: %s", str(e))
+        return None
 
 
 def upload_video(file_path: str) -> Optional[str]:
@@ -169,7 +238,10 @@ def send_media(media_type: str, user_ph: str, media_id: str, caption: str = "")
         caption: Optional caption for image/video
         
     Returns:
-        Response data
+        Response data, or None if the body was not JSON
+        
+    Raises:
+        requests.RequestException: if the request itself failed
     """
     url = f"{API_BASE}/messages"
 
@@ -189,91 +261,158 @@ def send_media(media_type: str, user_ph: str, media_id: str, caption: str = "")
     }
 
     try:
-        # _logger.info(f"DATA BEFORE SENDING! URL:{url}, HEADERS: {get_headers()}, DATA:{data}")
-        response = requests.post(url, headers=get_headers(), json=data)
+        response = session.post(url, headers=HEADERS, data=orjson.dumps(data))
         _logger.info("Media send response for %s: %s", media_id, response.status_code)
         
+        # Parse the body once; both the success and error paths return it
+        try:
+            resp_json = orjson.loads(response.content)
+        except ValueError:
+            _logger.error("Response not valid JSON: %s", response.text)
+            resp_json = None
+        
         if response.ok:
             _logger.info("Media %s sent successfully to %s", media_id, user_ph)
-            # _logger.debug("Response JSON: %s", response.json())
-            return response.json()
-        else:
-            _logger.error("Failed to send media %s. Status: %s", media_id, response.status_code)
-            try:
-                error_obj = response.json()
-                _logger.error("Error response: %s", json.dumps(error_obj, indent=2))
-                handle_error(error_obj)
-                return response.json()
-            except ValueError:
-                _logger.error("Response not valid JSON: %s", response.text)
-                return response.json()
+            return resp_json
+        
+        _logger.error("Failed to send media %s. Status: %s", media_id, response.status_code)
+        if resp_json is not None:
+            _logger.error("Error response: %s", resp_json)
+            handle_error(resp_json)
+        return resp_json
                 
     except requests.RequestException as e:
         _logger.exception("Failed to send media %s: %s", media_id, str(e))
-        return response.json()
+        # Callers treat a raised send as a failure (tool error reply, task retry)
+        raise
 
 
-def download_media(media_id: str) -> Optional[Dict]:
+def _read_body(response: requests.Response) -> bytearray:
+    """
+    Read a streamed response body into a single buffer
+    
+    When the size is known up front the buffer is allocated once and filled
+    in place, instead of joining chunks into a second full-size copy.
+    """
+    content_length = response.headers.get("Content-Length")
+    
+    with response:
+        # Content-Length is the encoded size; decoded chunks won't match it
+        if not content_length or response.headers.get("Content-Encoding"):
+            buffer = bytearray()
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                buffer += chunk
+            return buffer
+        
+        size = int(content_length)
+        buffer = bytearray(size)
+        offset = 0
+        
+        with memoryview(buffer) as view:
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                end = offset + len(chunk)
+                if end > size:
+                    raise IOError(f"Media body exceeds Content-Length ({size} bytes)")
+                view[offset:end] = chunk
+                offset = end
+        
+        if offset != size:
+            raise IOError(f"Media body ended at {offset} of {size} bytes")
+        
+        return buffer
+
+
+def _fetch_media_info(media_id: str) -> Optional[Dict]:
+    """
+    Fetch media metadata (download 'url', 'mime_type', ...) from the Graph API
+    
+    Returns:
+        Response data, or None if the API returned an error
+        
+    Raises:
+        requests.RequestException: if the request itself failed
+        ValueError: if a successful response body is not valid JSON
+    """
+    url = f"{BASE_URL}/{media_id}/"
+    
+    _logger.info("GET %s", url)
+    response = session.get(url, headers=AUTH_HEADER)
+    _logger.info("Media URL fetch response for %s: %s", media_id, response.status_code)
+    
+    if response.ok:
+        response_data = orjson.loads(response.content)
+        _logger.info("Media URL received for %s", media_id)
+        _logger.debug("Response JSON: %s", response_data)
+        return response_data
+    
+    _logger.error("Failed to fetch media URL for %s. Status: %s", media_id, response.status_code)
+    try:
+        error_obj = orjson.loads(response.content)
+        _logger.error("Error response: %s", error_obj)
+        handle_error(error_obj)
+    except ValueError:
+        _logger.error("Response not valid JSON: %s", response.text)
+    return None
+
+
+def download_media(media_id: str, sink: Optional[BinaryIO] = None) -> Optional[Dict]:
     """
     Download media file from WhatsApp
     
     Args:
         media_id: ID of the media to download
+        sink: Optional writable file object; the body is streamed into it in
+            chunks instead of being held in memory
         
     Returns:
-        Dict with 'content_type', 'data', and 'mime_type' if successful, None otherwise
+        Dict with 'content_type', 'data' and 'mime_type' if successful, None otherwise.
+        'data' is a bytearray, or the sink when one was given.
     """
-    url = f"{BASE_URL}/{media_id}/"
-    headers = get_auth_header()
-
     try:
-        _logger.info(f"GET {url}")
-        response = requests.get(url, headers=headers)
-        _logger.info("Media URL fetch response for %s: %s", media_id, response.status_code)
+        response_data = _fetch_media_info(media_id)
+        if response_data is None:
+            return None
 
-        if response.ok:
-            response_data = response.json()
-            _logger.info("Media URL received for %s", media_id)
-            _logger.debug("Response JSON: %s", response_data)
-
-            dl_url = response_data.get("url")
-            if not dl_url:
-                _logger.error("No download URL in response for %s", media_id)
-                return None
-
-            _logger.info("Starting media download from %s", dl_url)
-            dl_resp = requests.get(dl_url, headers=headers, stream=True)
-
-            if dl_resp.ok:
-                _logger.info("Media downloaded for %s", media_id)
-                return {
-                    "content_type": dl_resp.headers.get("Content-Type"),
-                    "data": dl_resp.content,
-                    "mime_type": response_data["mime_type"]
-                }
+        dl_url = response_data.get("url")
+        if not dl_url:
+            _logger.error("No download URL in response for %s", media_id)
+            return None
+
+        _logger.info("Starting media download from %s", dl_url)
+        dl_resp = session.get(dl_url, headers=AUTH_HEADER, stream=True)
+
+        if dl_resp.ok:
+            if sink is not None:
+                with dl_resp:
+                    for chunk in dl_resp.iter_content(DOWNLOAD_CHUNK_SIZE):
+                        sink.write(chunk)
+                data = sink
             else:
-                _logger.error("Failed to download media for %s. Status: %s", media_id, dl_resp.status_code)
-                try:
-                    error_obj = dl_resp.json()
-                    _logger.error("Download error response: %s", json.dumps(error_obj, indent=2))
-                    handle_error(error_obj)
-                except ValueError:
-                    _logger.error("Download response not valid JSON: %s", dl_resp.text)
-                return None
-
-        # Outer API fetch failed
-        _logger.error("Failed to fetch media URL for %s. Status: %s", media_id, response.status_code)
+                data = _read_body(dl_resp)
+            
+            _logger.info("Media downloaded for %s", media_id)
+            return {
+                "content_type": dl_resp.headers.get("Content-Type"),
+                "data": data,
+                "mime_type": response_data["mime_type"]
+            }
+
+        _logger.error("Failed to download media for %s. Status: %s", media_id, dl_resp.status_code)
         try:
-            error_obj = response.json()
-            _logger.error("Error response: %s", json.dumps(error_obj, indent=2))
+            error_obj = orjson.loads(dl_resp.content)
+            _logger.error("Download error response: %s", error_obj)
             handle_error(error_obj)
         except ValueError:
-            _logger.error("Response not valid JSON: %s", response.text)
+            _logger.error("Download response not valid JSON: %s", dl_resp.text)
         return None
 
-    except requests.RequestException as e:
+    except (requests.RequestException, ValueError) as e:
         _logger.exception("Media URL fetch request failed for %s: %s", media_id, str(e))
         return None
+    
+    except IOError as e:
+        _logger.error("Media download incomplete for %s: %s", media_id, e)
+        return None
 
 
 def get_url(media_id: str) -> Optional[Dict]:
@@ -286,37 +425,20 @@ def get_url(media_id: str) -> Optional[Dict]:
     Returns:
         Dict with 'url' key if successful, dict with 'error' key if failed
     """
-    url = f"{BASE_URL}/{media_id}/"
-    headers = get_auth_header()
-
     try:
-        _logger.info(f"GET {url}")
-        response = requests.get(url, headers=headers)
-        _logger.info("Media URL fetch response for %s: %s", media_id, response.status_code)
+        response_data = _fetch_media_info(media_id)
+        if response_data is None:
+            return None
 
-        if response.ok:
-            response_data = response.json()
-            _logger.info("Media URL received for %s", media_id)
-            _logger.debug("Response JSON: %s", response_data)
-
-            dl_url = response_data.get("url")
-                
-            if not dl_url:
-                _logger.error("No download URL in response for %s", media_id)
-                return {"error": f"No download URL in response for {media_id}"}
-            else:
-                return {"url": dl_url}
+        dl_url = response_data.get("url")
             
-        _logger.error("Failed to fetch media URL for %s. Status: %s", media_id, response.status_code)
-        try:
-            error_obj = response.json()
-            _logger.error("Error response: %s", json.dumps(error_obj, indent=2))
-            handle_error(error_obj)
-        except ValueError:
-            _logger.error("Response not valid JSON: %s", response.text)
-        return None
+        if not dl_url:
+            _logger.error("No download URL in response for %s", media_id)
+            return {"error": f"No download URL in response for {media_id}"}
+        else:
+            return {"url": dl_url}
 
-    except requests.RequestException as e:
+    except (requests.RequestException, ValueError) as e:
         message = f"Media URL fetch request failed for {media_id}, {str(e)}"
         _logger.exception(message)
-        return {"error": message}
\ No newline at end of file
+        return {"error": message}
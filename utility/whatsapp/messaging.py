@@ -2,11 +2,11 @@
 WhatsApp messaging functions (text messages, typing indicators)
 """
 
-import json
+import orjson
 import requests
 from typing import Optional
 from config import logger
-from .constants import API_BASE, get_headers
+from .constants import API_BASE, HEADERS, session
 from .errors import handle_error
 
 _logger = logger(__name__)
@@ -32,12 +32,12 @@ def send_message(to: str, message: str) -> Optional[dict]:
     }
 
     try:
-        response = requests.post(url, headers=get_headers(), json=data)
+        response = session.post(url, headers=HEADERS, data=orjson.dumps(data))
         _logger.info("Message send response: %s", response.status_code)
         
         resp_data = None
         try:
-            resp_data = response.json()
+            resp_data = orjson.loads(response.content)
         except Exception as e:
             _logger.error(f"Exception: {e}")
             _logger.error("Response not valid JSON: %s", response.text)
@@ -48,7 +48,7 @@ def send_message(to: str, message: str) -> Optional[dict]:
             return resp_data
         else:
             _logger.error("Failed to send message. Status: %s", response.status_code)
-            _logger.error("Error response: %s", json.dumps(resp_data, indent=2))
+            _logger.error("Error response: %s", resp_data)
             return resp_data
 
     except requests.RequestException as e:
@@ -77,18 +77,18 @@ def typing_indicator(msg_id: str) -> bool:
     }
 
     try:
-        response = requests.post(url, headers=get_headers(), json=data)
+        response = session.post(url, headers=HEADERS, data=orjson.dumps(data))
         _logger.info("Typing indicator response: %s", response.status_code)
 
         if response.ok:
+            # The body is only {"success": true}; don't parse it on the hot path
             _logger.info("Typing indicator sent for message %s", msg_id)
-            _logger.debug("Response JSON: %s", response.json())
             return True
 
         _logger.error("Failed to send typing indicator. Status: %s", response.status_code)
         try:
-            error_obj = response.json()
-            _logger.error("Error response: %s", json.dumps(error_obj, indent=2))
+            error_obj = orjson.loads(response.content)
+            _logger.error("Error response: %s", error_obj)
             handle_error(error_obj)
         except ValueError:
             _logger.error("Response not valid JSON: %s", response.text)
@@ -2,27 +2,37 @@ from config import logger
 
 _logger = logger(__name__)
 
+# Message types whose payload object (keyed by the type) carries a media id
+_MEDIA_TYPES = frozenset({"audio", "image", "video"})
+
 def normalize_webhook_payload(data: dict) -> dict: 
-    if "entry" not in data: return {"Error": "data not valid"}
+    entry = data.get("entry")
+    if not entry: return {"Error": "data not valid"}
     
-    value = data["entry"][0]["changes"][0]["value"]
+    # Dereference the fixed webhook shape once; everything below reads locals
+    value = entry[0]["changes"][0]["value"]
+    messages = value.get("messages")
+    contacts = value.get("contacts")
 
     # Inbound message
-    if "messages" in value and "contacts" in value:
+    if messages and contacts:
+        msg0 = messages[0]
+        contact0 = contacts[0]
         metadata = value["metadata"]
-        user_ph = value["contacts"][0]["wa_id"]
-        user_name = value["contacts"][0]["profile"]["name"]
-        msg_id = value["messages"][0]["id"]
-        category = value["messages"][0]["type"]
-        context = value["messages"][0]["context"] if "context" in value["messages"][0] else None
+        user_ph = contact0["wa_id"]
+        user_name = contact0["profile"]["name"]
+        msg_id = msg0["id"]
+        category = msg0["type"]
+        timestamp = msg0["timestamp"]
+        context = msg0.get("context")
 
         if category == "text":
-            message = value["messages"][0]["text"]["body"]
+            message = msg0["text"]["body"]
             return {
             "class": "text",
             "category": None,
             "type": "inbound",
-            "timestamp": value["messages"][0]["timestamp"],
+            "timestamp": timestamp,
             "metadata": metadata,
             "from": {
                 "phone": user_ph,
@@ -34,13 +44,9 @@ def normalize_webhook_payload(data: dict) -> dict:
             }
 
 
-        elif category in ["audio", "image", "video"]:
-            if category == "image":
-                media = value["messages"][0]["image"]
-            elif category == "audio":
-                media = value["messages"][0]["audio"]
-            else:  # video
-                media = value["messages"][0]["video"]
+        elif category in _MEDIA_TYPES:
+            # The media object is keyed by the message type
+            media = msg0[category]
 
             mime_type = media["mime_type"]
             media_id = media["id"]
@@ -48,7 +54,7 @@ def normalize_webhook_payload(data: dict) -> dict:
             "class": "media",
             "category": category,   
             "type": "inbound",
-            "timestamp": value["messages"][0]["timestamp"],
+            "timestamp": timestamp,
             "metadata": metadata,
             "from":{
                 "phone": user_ph,
@@ -56,7 +62,7 @@ def normalize_webhook_payload(data: dict) -> dict:
                 "message_id": msg_id,
                 "mime_type": mime_type,
                 "media_id": media_id,
-                "message": media["caption"] if "caption" in media else None
+                "message": media.get("caption")
                 },
             "context": context
             }
@@ -77,11 +83,13 @@ def normalize_webhook_payload(data: dict) -> dict:
             }
        
     # Delivery status
-    if "statuses" in value:
+    statuses = value.get("statuses")
+    if statuses:
+        st0 = statuses[0]
         return {
             "type": "status",
-            "id": value['statuses'][0]["id"],
-            "status": value['statuses'][0]['status'],    
+            "id": st0["id"],
+            "status": st0['status'],    
             "metadata": value.get("metadata", {}),
         }
 